@@ -1,16 +1,55 @@
+"""
+Script: analyze_books.py
+
+1) Analyzes every EPUB in the 'books/' folder in parallel worker processes.
+2) Caches each book's result by file hash, so unchanged books are not re-parsed.
+3) Writes machine-readable JSON with section word-count distributions and
+   chunking, embedding-token and FAISS index size projections.
+
+Usage:
+    python analyze_books.py [--folder DIR] [--output FILE] [--workers N] [--dimension N] [--no-cache]
+"""
+
+import argparse
+import hashlib
+import json
 import os
 import re
 import statistics
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
 from ebooklib import epub
 from bs4 import BeautifulSoup
 
-def get_text_from_epub_fallback(epub_path):
+from create_chunks import iter_toc_chapters, split_into_chunks
+
+# Chunking parameters used by create_chunks.py
+MAX_SINGLE = 1000
+CHUNK_SIZE = 800
+
+# Embedding model pricing and FAISS vector size used for projections
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_PRICE_PER_1K_TOKENS = 0.0001  # USD
+DEFAULT_DIMENSION = 1536  # Embedding size of text-embedding-ada-002
+
+# Bump when the per-book result format changes, to invalidate the cache
+ANALYSIS_VERSION = 3
+
+CACHE_DIR = ".analysis_cache"
+OUTPUT_FILE = "analysis_output.json"
+
+_encoding = None
+
+
+def get_text_from_epub_fallback(epub_path, book=None):
     """
     Extract text from every item in the EPUB that is 'application/xhtml+xml',
     ignoring the spine. This helps handle non-standard EPUBs.
     Returns a list of (section_title, section_text).
     """
-    book = epub.read_epub(epub_path)
+    if book is None:
+        book = epub.read_epub(epub_path)
     sections = []
     section_index = 0
 
@@ -37,70 +76,222 @@ def get_text_from_epub_fallback(epub_path):
 
     return sections
 
-def analyze_epub(epub_path):
+
+def get_encoding():
     """
-    Analyzes an EPUB file: extracts sections, counts words, prints stats.
-    Returns a string containing the analysis results (per-chapter & summary).
+    Returns the tiktoken encoding for the embedding model, or False if tiktoken
+    is not installed or its encoding can't be loaded (e.g. offline, not cached).
     """
-    sections = get_text_from_epub_fallback(epub_path)
-    if not sections:
-        return f"No valid text extracted from '{epub_path}'\n"
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model(EMBEDDING_MODEL)
+        except Exception:
+            _encoding = False
+    return _encoding
 
-    word_counts = []
-    lines = []
-    lines.append(f"=== Analyzing '{epub_path}' ===")
 
-    for i, (title, text) in enumerate(sections, start=1):
-        words = text.split()
-        word_count = len(words)
-        word_counts.append(word_count)
-        lines.append(f"  Section {i}: '{title[:50]}...' => Word Count: {word_count}")
+def token_counting_method():
+    return "tiktoken" if get_encoding() else "estimate"
 
+
+def count_tokens(text):
+    """
+    Counts embedding tokens with tiktoken if it is installed,
+    otherwise estimates them at ~4 characters per token.
+    """
+    if get_encoding():
+        return len(get_encoding().encode(text))
+    return (len(text) + 3) // 4
+
+
+def summarize_word_counts(word_counts):
+    """
+    Returns min/max/mean/median/p90 for a list of word counts.
+    """
     if not word_counts:
-        lines.append("No word counts found (possibly empty sections).")
-        return "\n".join(lines) + "\n"
+        return {"min": 0, "max": 0, "mean": 0.0, "median": 0.0, "p90": 0.0}
+
+    p90 = statistics.quantiles(word_counts, n=10, method="inclusive")[-1] if len(word_counts) > 1 else word_counts[0]
+    return {
+        "min": min(word_counts),
+        "max": max(word_counts),
+        "mean": round(sum(word_counts) / len(word_counts), 2),
+        "median": float(statistics.median(word_counts)),
+        "p90": round(float(p90), 2),
+    }
+
+
+def analyze_epub(epub_path):
+    """
+    Analyzes an EPUB file: section word counts (every XHTML item) and the chunks
+    create_chunks.py would produce from its TOC chapters.
+    Returns a dict with the analysis results. It holds only content-derived fields,
+    since it is cached by file hash and may be shared by renamed or duplicate files.
+    """
+    book = epub.read_epub(epub_path)
 
-    min_words = min(word_counts)
-    max_words = max(word_counts)
-    avg_words = sum(word_counts) / len(word_counts)
-    median_words = statistics.median(word_counts)
+    sections = get_text_from_epub_fallback(epub_path, book)
+    word_counts = [len(text.split()) for _, text in sections]
 
-    lines.append("\n--- Summary ---")
-    lines.append(f" Total Sections: {len(word_counts)}")
-    lines.append(f" Min Word Count: {min_words}")
-    lines.append(f" Max Word Count: {max_words}")
-    lines.append(f" Average Words: {avg_words:.2f}")
-    lines.append(f" Median Words: {median_words:.2f}")
-    lines.append("")
+    chapter_count = 0
+    chunk_word_counts = []
+    embedding_tokens = 0
+    for _, chapter_text in iter_toc_chapters(book, book.toc):
+        chapter_count += 1
+        for chunk_text in split_into_chunks(chapter_text, max_single=MAX_SINGLE, chunk_size=CHUNK_SIZE):
+            chunk_word_counts.append(len(chunk_text.split()))
+            embedding_tokens += count_tokens(chunk_text)
+
+    return {
+        "sections": {
+            "count": len(word_counts),
+            "total_words": sum(word_counts),
+            "word_counts": word_counts,
+            **summarize_word_counts(word_counts),
+        },
+        "chunks": {
+            "chapters": chapter_count,
+            "count": len(chunk_word_counts),
+            "total_words": sum(chunk_word_counts),
+            "embedding_tokens": embedding_tokens,
+            **summarize_word_counts(chunk_word_counts),
+        },
+    }
+
+
+def file_hash(path):
+    """
+    Returns the SHA-256 hex digest of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path(digest):
+    key = f"{digest}-v{ANALYSIS_VERSION}-{MAX_SINGLE}-{CHUNK_SIZE}-{token_counting_method()}"
+    return Path(CACHE_DIR) / f"{key}.json"
+
+
+def load_cached_result(digest):
+    """
+    Returns the cached analysis for a file hash, or None.
+    """
+    path = cache_path(digest)
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return None
+
+
+def save_cached_result(digest, result):
+    Path(CACHE_DIR).mkdir(exist_ok=True)
+    with open(cache_path(digest), "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+
+
+def book_entry(epub_name, digest, result):
+    """
+    Combines a (possibly cached) analysis result with the file it was computed for.
+    """
+    return {"file": epub_name, "book_title": Path(epub_name).stem, "sha256": digest, **result}
+
+
+def project_totals(results, dimension):
+    """
+    Sums per-book results into corpus-wide chunk, token, cost and FAISS size projections.
+    """
+    totals = {
+        "books": len(results),
+        "sections": sum(r["sections"]["count"] for r in results),
+        "section_words": sum(r["sections"]["total_words"] for r in results),
+        "chunks": sum(r["chunks"]["count"] for r in results),
+        "embedding_tokens": sum(r["chunks"]["embedding_tokens"] for r in results),
+    }
+    totals["embedding_cost_usd"] = round(
+        totals["embedding_tokens"] / 1000 * EMBEDDING_PRICE_PER_1K_TOKENS, 4
+    )
+    # IndexFlatL2 stores one float32 vector per chunk
+    totals["faiss_index_bytes"] = totals["chunks"] * dimension * 4
+    return totals
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Analyze EPUBs and project chunking and embedding costs.")
+    parser.add_argument("--folder", default="books")
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--dimension", type=int, default=DEFAULT_DIMENSION)
+    parser.add_argument("--no-cache", action="store_true")
+    return parser.parse_args()
 
-    return "\n".join(lines) + "\n"
 
 def main():
-    folder_path = "books"
-    output_file = "analysis_output.txt"
+    args = parse_args()
 
-    # Collect all EPUB files in the 'books' folder
-    epub_files = [f for f in os.listdir(folder_path) if f.lower().endswith(".epub")]
+    # Collect all EPUB files in the books folder
+    epub_files = sorted(f for f in os.listdir(args.folder) if f.lower().endswith(".epub"))
 
     # If there are no EPUB files, let the user know
     if not epub_files:
-        print(f"No EPUB files found in '{folder_path}'.")
+        print(f"No EPUB files found in '{args.folder}'.")
         return
 
-    # Open an output file to write all results
-    with open(output_file, "w", encoding="utf-8") as out:
-        for epub_name in epub_files:
-            epub_path = os.path.join(folder_path, epub_name)
+    results = {}
+    errors = {}
+    pending = {}
+    for epub_name in epub_files:
+        epub_path = os.path.join(args.folder, epub_name)
+        digest = file_hash(epub_path)
+        cached = None if args.no_cache else load_cached_result(digest)
+        if cached is not None:
+            results[epub_name] = book_entry(epub_name, digest, cached)
+        else:
+            pending[epub_name] = (epub_path, digest)
+
+    print(f"{len(results)} books cached, {len(pending)} to analyze.")
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(analyze_epub, epub_path): (epub_name, digest)
+            for epub_name, (epub_path, digest) in pending.items()
+        }
+        for future in as_completed(futures):
+            epub_name, digest = futures[future]
             try:
-                result = analyze_epub(epub_path)
-                out.write(result + "\n")
-                print(f"Analysis for '{epub_name}' written to {output_file}")
+                result = future.result()
             except Exception as e:
-                error_msg = f"Error analyzing '{epub_name}': {e}\n"
-                out.write(error_msg)
-                print(error_msg)
+                errors[epub_name] = str(e)
+                print(f"Error analyzing '{epub_name}': {e}")
+                continue
+            save_cached_result(digest, result)
+            results[epub_name] = book_entry(epub_name, digest, result)
+            print(f"Analyzed '{epub_name}'")
+
+    books = [results[name] for name in epub_files if name in results]
+    output = {
+        "settings": {
+            "max_single": MAX_SINGLE,
+            "chunk_size": CHUNK_SIZE,
+            "embedding_model": EMBEDDING_MODEL,
+            "token_counting": token_counting_method(),
+            "embedding_price_per_1k_tokens": EMBEDDING_PRICE_PER_1K_TOKENS,
+            "dimension": args.dimension,
+        },
+        "totals": project_totals(books, args.dimension),
+        "books": books,
+        "errors": errors,
+    }
+
+    with open(args.output, "w", encoding="utf-8") as out:
+        json.dump(output, out, ensure_ascii=False, indent=2)
+
+    print(f"\nAll analysis complete! Results saved to '{args.output}'.")
 
-    print(f"\nAll analysis complete! Results saved to '{output_file}'.")
 
 if __name__ == "__main__":
     main()
@@ -9,10 +9,12 @@ Script: app.py
 from flask import Flask, request, jsonify
 import sqlite3
 import faiss
-import openai
 import numpy as np
 import json
 
+from embeddings import check_index_dimension, load_backend_for_index, load_index_metadata
+from text_store import METADATA_COLUMNS, load_text_store, resolve_texts
+
 # File paths
 DB_PATH = "books.db"
 FAISS_INDEX_PATH = "faiss_index.index"
@@ -21,6 +23,12 @@ CHUNK_MAPPING_PATH = "id_to_chunk_mapping.json"
 # Flask app setup
 app = Flask(__name__)
 
+# Packed chunk texts, memory-mapped once (None if text_store.py hasn't been run)
+TEXT_STORE = load_text_store()
+
+# Embedding backends by (backend, model, dimension), so local models are loaded once
+EMBEDDING_BACKENDS = {}
+
 def load_faiss_index(index_path):
     """
     Loads the FAISS index from the file.
@@ -38,15 +46,26 @@ def load_chunk_mapping(mapping_path):
         return json.load(f)
 
 
-def embed_query(query):
+def load_embedding_backend(index_path, index):
+    """
+    Returns the embedding backend recorded in the FAISS index metadata, reusing
+    an already-loaded backend if the metadata hasn't changed.
+    Raises ValueError if the index doesn't match the backend's dimension.
+    """
+    metadata = load_index_metadata(index_path)
+    key = (metadata["backend"], metadata["model"], metadata["dimension"])
+    if key not in EMBEDDING_BACKENDS:
+        EMBEDDING_BACKENDS[key] = load_backend_for_index(index_path)
+    backend = EMBEDDING_BACKENDS[key]
+    check_index_dimension(index, backend, index_path)
+    return backend
+
+
+def embed_query(query, backend):
     """
-    Embeds the user query using OpenAI's `text-embedding-ada-002`.
+    Embeds the user query with the same backend the FAISS index was built with.
     """
-    response = openai.Embedding.create(
-        input=query,
-        model="text-embedding-ada-002"
-    )
-    return np.array(response["data"][0]["embedding"], dtype=np.float32)
+    return backend.embed([query])[0]
 
 
 def search_faiss(index, query_vector, top_k=5):
@@ -59,19 +78,24 @@ def search_faiss(index, query_vector, top_k=5):
     return vector_ids[0], distances[0]  # Return the first (and only) query results
 
 
-def get_chunks_from_db(db_path, chunk_ids):
+def get_chunks_from_db(db_path, chunk_ids, text_store=None):
     """
     Retrieves the chunk text and metadata for given chunk IDs from SQLite.
+    If a packed text store is given, texts are taken from it where it matches SQLite,
+    and only the remaining texts are read from SQLite.
     """
+    columns = METADATA_COLUMNS if text_store else "id, book_title, chapter_title, local_index, text"
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     query = f"""
-        SELECT id, book_title, chapter_title, local_index, text
+        SELECT {columns}
         FROM chunks
         WHERE id IN ({','.join(['?'] * len(chunk_ids))})
     """
     cursor.execute(query, chunk_ids)
     results = cursor.fetchall()
+    if text_store:
+        results = resolve_texts(cursor, results, text_store)
     conn.close()
     return results
 
@@ -88,13 +112,17 @@ def handle_query():
     user_query = data["query"]
     print(f"Received query: {user_query}")
 
-    # Step 1: Load FAISS index and chunk mapping
+    # Step 1: Load FAISS index, its embedding backend and chunk mapping
     index = load_faiss_index(FAISS_INDEX_PATH)
+    try:
+        backend = load_embedding_backend(FAISS_INDEX_PATH, index)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 500
     chunk_mapping = load_chunk_mapping(CHUNK_MAPPING_PATH)
 
     # Step 2: Embed the user query
     print("Embedding the query...")
-    query_vector = embed_query(user_query)
+    query_vector = embed_query(user_query, backend)
 
     # Step 3: Perform FAISS search
     print("Searching FAISS index...")
@@ -106,7 +134,7 @@ def handle_query():
 
     # Step 5: Retrieve chunks and their metadata
     print("Fetching chunks and metadata...")
-    matched_chunks = get_chunks_from_db(DB_PATH, chunk_ids)
+    matched_chunks = get_chunks_from_db(DB_PATH, chunk_ids, TEXT_STORE)
 
     # Format results for JSON response
     results = []
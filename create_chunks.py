@@ -78,14 +78,10 @@ def extract_text_from_href(book, href):
     text = re.sub(r'\s+', ' ', text).strip()
     return text
 
-def process_toc_entries(book, entries, book_title, session):
+def iter_toc_chapters(book, entries):
     """
-    Recursively process a list of TOC entries (which can be Link objects or nested lists).
-    For each Link, we:
-      1) Get entry.title (the real chapter name)
-      2) Get entry.href to find the relevant HTML
-      3) Extract text and chunk it
-      4) Store in the DB
+    Recursively walks a list of TOC entries (which can be Link objects or nested lists)
+    and yields (chapter_title, chapter_text) for every entry with extractable text.
     """
     for entry in entries:
         if isinstance(entry, epub.Link):
@@ -97,20 +93,11 @@ def process_toc_entries(book, entries, book_title, session):
             if not chapter_text:
                 continue
 
-            # Split into chunks
-            chunk_texts = split_into_chunks(chapter_text, max_single=1000, chunk_size=800)
-            for local_idx, chunk_str in enumerate(chunk_texts):
-                db_chunk = Chunk(
-                    book_title=book_title,
-                    chapter_title=chapter_title[:200],  # truncate for safety
-                    local_index=local_idx,
-                    text=chunk_str
-                )
-                session.add(db_chunk)
+            yield chapter_title[:200], chapter_text  # truncate for safety
 
         elif isinstance(entry, list):
             # It's a nested TOC (sub-chapters). Recursively process.
-            process_toc_entries(book, entry, book_title, session)
+            yield from iter_toc_chapters(book, entry)
 
         else:
             # Some EPUBs embed tuples like (href, title, subitems) 
@@ -127,21 +114,33 @@ def process_toc_entries(book, entries, book_title, session):
                 # Extract text for the main entry
                 chapter_text = extract_text_from_href(book, href)
                 if chapter_text:
-                    chunk_texts = split_into_chunks(chapter_text, 1000, 800)
-                    for local_idx, chunk_str in enumerate(chunk_texts):
-                        db_chunk = Chunk(
-                            book_title=book_title,
-                            chapter_title=str(chapter_title)[:200],
-                            local_index=local_idx,
-                            text=chunk_str
-                        )
-                        session.add(db_chunk)
+                    yield str(chapter_title)[:200], chapter_text
 
                 # Recursively process subitems
                 if subitems:
-                    process_toc_entries(book, subitems, book_title, session)
+                    yield from iter_toc_chapters(book, subitems)
             # else: ignore other odd structures
 
+def process_toc_entries(book, entries, book_title, session):
+    """
+    Process a list of TOC entries.
+    For each chapter, we:
+      1) Get the real chapter name and its extracted text
+      2) Chunk the text
+      3) Store the chunks in the DB
+    """
+    for chapter_title, chapter_text in iter_toc_chapters(book, entries):
+        # Split into chunks
+        chunk_texts = split_into_chunks(chapter_text, max_single=1000, chunk_size=800)
+        for local_idx, chunk_str in enumerate(chunk_texts):
+            db_chunk = Chunk(
+                book_title=book_title,
+                chapter_title=chapter_title,
+                local_index=local_idx,
+                text=chunk_str
+            )
+            session.add(db_chunk)
+
 def main():
     session = get_db_session("books.db")
     books_folder = Path("books")
@@ -3,17 +3,32 @@ Script: generate_faiss_incremental.py
 
 1) Reads chunks from SQLite database.
 2) Checks for an existing FAISS index and adds only the chunks that are not yet embedded.
-3) Generates embeddings using OpenAI's `text-embedding-ada-002`.
+3) Generates embeddings in batches with the selected backend (see embeddings.py).
 4) Stores embeddings in the FAISS index, continuing from where it left off.
+
+Usage:
+    python embed_chunks.py [--backend openai|sentence-transformers|hashing] [--model NAME] [--dimension N]
+
+An existing index keeps the backend recorded in its metadata file.
 """
 
+import argparse
 import sqlite3
 import faiss
-import openai
 import numpy as np
 import json
 from pathlib import Path
 
+from embeddings import (
+    DEFAULT_BACKEND,
+    BACKENDS,
+    get_embedding_backend,
+    index_metadata_path,
+    load_backend_for_index,
+    save_index_metadata,
+)
+from text_store import METADATA_COLUMNS, load_text_store, resolve_texts
+
 # SQLite database location
 DB_PATH = "books.db"
 
@@ -23,30 +38,100 @@ FAISS_INDEX_PATH = "faiss_index.index"
 # Mapping file for chunk_id to FAISS vector IDs
 CHUNK_MAPPING_PATH = "id_to_chunk_mapping.json"
 
+# Number of chunks embedded per backend call
+BATCH_SIZE = 64
 
-def get_chunks_from_db(db_path):
+
+def get_chunks_from_db(db_path, text_store=None):
     """
     Reads chunks from the SQLite database.
+    If a packed text store is given, texts are taken from it where it matches SQLite,
+    and only the remaining texts are read from SQLite.
     Returns a list of (chunk_id, text).
     """
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
-    cursor.execute("SELECT id, text FROM chunks")
-    chunks = cursor.fetchall()  # List of (id, text)
+    if text_store:
+        cursor.execute(f"SELECT {METADATA_COLUMNS} FROM chunks")
+        chunks = [(row[0], row[-1]) for row in resolve_texts(cursor, cursor.fetchall(), text_store)]
+    else:
+        cursor.execute("SELECT id, text FROM chunks")
+        chunks = cursor.fetchall()  # List of (id, text)
     conn.close()
     return chunks
 
 
-def generate_embedding(text):
+def generate_embeddings(texts, backend):
     """
-    Generates an embedding for a given text using OpenAI's `text-embedding-ada-002`.
-    Returns a 1536-dimensional vector.
+    Generates embeddings for a batch of texts with the given backend.
+    Returns a (len(texts), backend.dimension) float32 array.
     """
-    response = openai.Embedding.create(
-        input=text,
-        model="text-embedding-ada-002"
-    )
-    return np.array(response["data"][0]["embedding"])
+    return np.asarray(backend.embed(texts), dtype=np.float32)
+
+
+def embed_batch(batch, backend):
+    """
+    Embeds a batch of (chunk_id, text) pairs.
+    If the batch call fails, retries each chunk on its own so one bad chunk
+    doesn't keep the rest of the batch out of the index.
+    Returns the embedded chunk IDs and their (n, backend.dimension) embeddings.
+    """
+    try:
+        return [chunk_id for chunk_id, _ in batch], generate_embeddings([text for _, text in batch], backend)
+    except Exception as e:
+        print(f"Error embedding chunks {batch[0][0]}-{batch[-1][0]}, retrying one by one: {e}")
+
+    chunk_ids = []
+    embeddings = []
+    for chunk_id, text in batch:
+        try:
+            embeddings.append(generate_embeddings([text], backend)[0])
+            chunk_ids.append(chunk_id)
+        except Exception as e:
+            print(f"Error embedding chunk {chunk_id}: {e}")
+            continue
+    return chunk_ids, np.array(embeddings, dtype=np.float32).reshape(-1, backend.dimension)
+
+
+def select_backend(args, index_path):
+    """
+    Returns the backend recorded for an existing index, or the one requested
+    on the command line for a new index.
+    """
+    if Path(index_path).exists():
+        backend = load_backend_for_index(index_path)
+        if args.backend and args.backend != backend.name:
+            raise ValueError(
+                f"{index_path} was built with the '{backend.name}' backend; "
+                f"delete it to rebuild with '{args.backend}'"
+            )
+        if args.model and args.model != backend.model:
+            raise ValueError(
+                f"{index_path} was built with the '{backend.model}' model; "
+                f"delete it to rebuild with '{args.model}'"
+            )
+        if args.dimension and args.dimension != backend.dimension:
+            raise ValueError(
+                f"{index_path} was built with {backend.dimension}-d vectors; "
+                f"delete it to rebuild with {args.dimension}-d vectors"
+            )
+        return backend
+
+    backend = get_embedding_backend(args.backend or DEFAULT_BACKEND, args.model, args.dimension)
+    if args.dimension and args.dimension != backend.dimension:
+        raise ValueError(
+            f"The '{backend.name}' backend ({backend.model}) produces {backend.dimension}-d vectors, "
+            f"not {args.dimension}-d"
+        )
+    return backend
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Embed SQLite chunks into a FAISS index.")
+    parser.add_argument("--backend", choices=list(BACKENDS), default=None)
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--dimension", type=int, default=None)
+    return parser.parse_args()
 
 
 def create_faiss_index(dimension, index_path=None):
@@ -93,13 +178,16 @@ def save_faiss_index(index, index_path):
 
 
 def main():
+    args = parse_args()
+
     # 1. Load chunks from SQLite database
     print("Loading chunks from SQLite database...")
-    chunks = get_chunks_from_db(DB_PATH)
+    chunks = get_chunks_from_db(DB_PATH, load_text_store())
 
-    # 2. Initialize FAISS index
-    dimension = 1536  # Embedding size of text-embedding-ada-002
-    index = create_faiss_index(dimension, FAISS_INDEX_PATH)
+    # 2. Select the embedding backend and initialize FAISS index
+    backend = select_backend(args, FAISS_INDEX_PATH)
+    print(f"Using embedding backend '{backend.name}' ({backend.model}, {backend.dimension}-d)")
+    index = create_faiss_index(backend.dimension, FAISS_INDEX_PATH)
 
     # 3. Load chunk-to-FAISS mapping
     chunk_mapping = load_chunk_mapping(CHUNK_MAPPING_PATH)
@@ -109,18 +197,20 @@ def main():
     unembedded_chunks = [(chunk_id, text) for chunk_id, text in chunks if str(chunk_id) not in embedded_chunk_ids]
     print(f"{len(unembedded_chunks)} chunks need embeddings (out of {len(chunks)} total).")
 
-    # 5. Embed chunks and add to FAISS index
-    for chunk_id, text in unembedded_chunks:
-        try:
-            embedding = generate_embedding(text)
-            index.add(np.array([embedding], dtype=np.float32))  # Add to FAISS
-            chunk_mapping[str(index.ntotal - 1)] = chunk_id  # Map FAISS vector ID to chunk_id
-        except Exception as e:
-            print(f"Error embedding chunk {chunk_id}: {e}")
+    # 5. Embed chunks in batches and add to FAISS index
+    for start in range(0, len(unembedded_chunks), BATCH_SIZE):
+        chunk_ids, embeddings = embed_batch(unembedded_chunks[start:start + BATCH_SIZE], backend)
+        if not chunk_ids:
             continue
+        first_vector_id = index.ntotal
+        index.add(embeddings)  # Add to FAISS
+        for offset, chunk_id in enumerate(chunk_ids):
+            chunk_mapping[str(first_vector_id + offset)] = chunk_id  # Map FAISS vector ID to chunk_id
 
-    # 6. Save updated FAISS index and mapping
+    # 6. Save updated FAISS index, its metadata and mapping
     save_faiss_index(index, FAISS_INDEX_PATH)
+    save_index_metadata(FAISS_INDEX_PATH, backend)
+    print(f"Index metadata saved to {index_metadata_path(FAISS_INDEX_PATH)}")
     save_chunk_mapping(chunk_mapping, CHUNK_MAPPING_PATH)
 
     print("All embeddings processed and stored in FAISS index.")
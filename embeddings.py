@@ -0,0 +1,183 @@
+"""
+Module: embeddings.py
+
+Embedding backends shared by embed_chunks.py, search.py and app.py.
+
+1) "openai": OpenAI's `text-embedding-ada-002` (network round trip per call).
+2) "sentence-transformers": a local sentence-embedding model run in-process on CPU.
+   Requires: pip install sentence-transformers
+3) "hashing": a dependency-free hashed bag-of-words projection. Works offline with
+   no model download, as a fallback when no local model is available.
+
+Each FAISS index records the backend, model and dimension it was built with in a
+metadata file next to it, so queries are always embedded the same way as the index.
+"""
+
+import json
+import math
+import re
+import zlib
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_BACKEND = "openai"
+
+# Output dimensions of known OpenAI embedding models
+OPENAI_MODEL_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+
+class OpenAIEmbeddingBackend:
+    """
+    Embeds texts with the OpenAI embeddings API.
+    The dimension of models not in OPENAI_MODEL_DIMENSIONS is taken from a probe request.
+    """
+    name = "openai"
+
+    def __init__(self, model="text-embedding-ada-002"):
+        import openai
+
+        self._openai = openai
+        self.model = model
+        self.dimension = OPENAI_MODEL_DIMENSIONS.get(model)
+        if self.dimension is None:
+            self.dimension = self.embed(["dimension probe"]).shape[1]
+
+    def embed(self, texts):
+        response = self._openai.Embedding.create(input=texts, model=self.model)
+        data = sorted(response["data"], key=lambda item: item["index"])
+        return np.array([item["embedding"] for item in data], dtype=np.float32)
+
+
+class SentenceTransformerBackend:
+    """
+    Embeds texts in-process with a local sentence-transformers model.
+    """
+    name = "sentence-transformers"
+
+    def __init__(self, model="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "The 'sentence-transformers' backend requires: pip install sentence-transformers"
+            ) from e
+
+        self._model = SentenceTransformer(model, device="cpu")
+        self.model = model
+        self.dimension = self._model.get_sentence_embedding_dimension()
+
+    def embed(self, texts):
+        vectors = self._model.encode(
+            list(texts), batch_size=32, normalize_embeddings=True, convert_to_numpy=True
+        )
+        return vectors.astype(np.float32)
+
+
+class HashingEmbeddingBackend:
+    """
+    Projects word and word-bigram counts into a fixed number of buckets using a
+    signed hash, with sublinear term frequency and L2 normalization.
+    """
+    name = "hashing"
+
+    def __init__(self, model="hashing-v1", dimension=1024):
+        self.model = model
+        self.dimension = int(dimension)
+
+    def _features(self, text):
+        words = re.findall(r"\w+", text.lower())
+        bigrams = [f"{a} {b}" for a, b in zip(words, words[1:])]
+        return Counter(words + bigrams)
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self._features(text).items():
+                h = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                vectors[row, h % self.dimension] += sign * (1.0 + math.log(count))
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (OpenAIEmbeddingBackend, SentenceTransformerBackend, HashingEmbeddingBackend)
+}
+
+
+def get_embedding_backend(name=DEFAULT_BACKEND, model=None, dimension=None):
+    """
+    Creates the embedding backend with the given name.
+    `model` and `dimension` override the backend defaults where supported.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+
+    kwargs = {}
+    if model:
+        kwargs["model"] = model
+    if dimension and name == HashingEmbeddingBackend.name:
+        kwargs["dimension"] = dimension
+    return BACKENDS[name](**kwargs)
+
+
+def index_metadata_path(index_path):
+    """
+    Returns the metadata file path for a FAISS index, e.g. faiss_index.meta.json.
+    """
+    return Path(index_path).with_suffix(".meta.json")
+
+
+def save_index_metadata(index_path, backend):
+    """
+    Records which backend, model and dimension the FAISS index was built with.
+    """
+    metadata = {"backend": backend.name, "model": backend.model, "dimension": backend.dimension}
+    with open(index_metadata_path(index_path), "w") as f:
+        json.dump(metadata, f)
+
+
+def load_index_metadata(index_path):
+    """
+    Loads the FAISS index metadata.
+    Indexes built before backends were recorded are assumed to use OpenAI's ada-002.
+    """
+    path = index_metadata_path(index_path)
+    if path.exists():
+        with open(path, "r") as f:
+            return json.load(f)
+    return {"backend": "openai", "model": "text-embedding-ada-002", "dimension": 1536}
+
+
+def load_backend_for_index(index_path):
+    """
+    Creates the embedding backend the FAISS index was built with.
+    """
+    metadata = load_index_metadata(index_path)
+    backend = get_embedding_backend(metadata["backend"], metadata["model"], metadata["dimension"])
+    if backend.dimension != metadata["dimension"]:
+        raise ValueError(
+            f"Backend '{backend.name}' ({backend.model}) produces {backend.dimension}-d vectors, "
+            f"but {index_path} was built with {metadata['dimension']}-d vectors"
+        )
+    return backend
+
+
+def check_index_dimension(index, backend, index_path):
+    """
+    Raises ValueError if the FAISS index doesn't hold vectors of the backend's dimension.
+    """
+    if index.d != backend.dimension:
+        raise ValueError(
+            f"{index_path} holds {index.d}-d vectors, but its embedding backend "
+            f"'{backend.name}' ({backend.model}) produces {backend.dimension}-d vectors"
+        )
@@ -2,17 +2,19 @@
 Script: search_faiss.py
 
 1) Takes a user input query.
-2) Embeds the query using OpenAI's `text-embedding-ada-002`.
+2) Embeds the query with the backend the FAISS index was built with (see embeddings.py).
 3) Searches for the most relevant chunks in the FAISS index.
 4) Retrieves chunk text and metadata from SQLite based on the results.
 """
 
 import sqlite3
 import faiss
-import openai
 import numpy as np
 import json
 
+from embeddings import check_index_dimension, load_backend_for_index
+from text_store import METADATA_COLUMNS, load_text_store, resolve_texts
+
 # File paths
 DB_PATH = "books.db"
 FAISS_INDEX_PATH = "faiss_index.index"
@@ -36,15 +38,11 @@ def load_chunk_mapping(mapping_path):
         return json.load(f)
 
 
-def embed_query(query):
+def embed_query(query, backend):
     """
-    Embeds the user query using OpenAI's `text-embedding-ada-002`.
+    Embeds the user query with the same backend the FAISS index was built with.
     """
-    response = openai.Embedding.create(
-        input=query,
-        model="text-embedding-ada-002"
-    )
-    return np.array(response["data"][0]["embedding"], dtype=np.float32)
+    return backend.embed([query])[0]
 
 
 def search_faiss(index, query_vector, top_k=5):
@@ -57,37 +55,47 @@ def search_faiss(index, query_vector, top_k=5):
     return vector_ids[0], distances[0]  # Return the first (and only) query results
 
 
-def get_chunks_from_db(db_path, chunk_ids):
+def get_chunks_from_db(db_path, chunk_ids, text_store=None):
     """
     Retrieves the chunk text and metadata for given chunk IDs from SQLite.
+    If a packed text store is given, texts are taken from it where it matches SQLite,
+    and only the remaining texts are read from SQLite.
     """
+    columns = METADATA_COLUMNS if text_store else "id, book_title, chapter_title, local_index, text"
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     query = f"""
-        SELECT id, book_title, chapter_title, local_index, text
+        SELECT {columns}
         FROM chunks
         WHERE id IN ({','.join(['?'] * len(chunk_ids))})
     """
     cursor.execute(query, chunk_ids)
     results = cursor.fetchall()
+    if text_store:
+        results = resolve_texts(cursor, results, text_store)
     conn.close()
     return results
 
 
-def get_all_chunks_for_chapter(db_path, book_title, chapter_title):
+def get_all_chunks_for_chapter(db_path, book_title, chapter_title, text_store=None):
     """
     Retrieves all chunks for the specified book and chapter.
+    If a packed text store is given, texts are taken from it where it matches SQLite,
+    and only the remaining texts are read from SQLite.
     """
+    columns = METADATA_COLUMNS if text_store else "id, book_title, chapter_title, local_index, text"
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
-    query = """
-        SELECT id, book_title, chapter_title, local_index, text
+    query = f"""
+        SELECT {columns}
         FROM chunks
         WHERE book_title = ? AND chapter_title = ?
         ORDER BY local_index
     """
     cursor.execute(query, (book_title, chapter_title))
     results = cursor.fetchall()
+    if text_store:
+        results = resolve_texts(cursor, results, text_store)
     conn.close()
     return results
 
@@ -122,13 +130,16 @@ def main():
     # 1. Load FAISS index and mapping
     index = load_faiss_index(FAISS_INDEX_PATH)
     chunk_mapping = load_chunk_mapping(CHUNK_MAPPING_PATH)
+    text_store = load_text_store()
+    backend = load_backend_for_index(FAISS_INDEX_PATH)
+    check_index_dimension(index, backend, FAISS_INDEX_PATH)
 
     # 2. Take user input
     query = input("Enter your query: ")
 
     # 3. Embed the user query
     print("Embedding the query...")
-    query_vector = embed_query(query)
+    query_vector = embed_query(query, backend)
 
     # 4. Perform FAISS search
     print("Searching FAISS index...")
@@ -140,7 +151,7 @@ def main():
 
     # 6. Retrieve chunks and their metadata
     print("Fetching chunks and metadata...")
-    matched_chunks = get_chunks_from_db(DB_PATH, chunk_ids)
+    matched_chunks = get_chunks_from_db(DB_PATH, chunk_ids, text_store)
 
     # 7. Retrieve all chunks from the chapters of the matched chunks
     all_relevant_chunks = []
@@ -148,7 +159,7 @@ def main():
     for _, book_title, chapter_title, _, _ in matched_chunks:
         chapter_key = (book_title, chapter_title)
         if chapter_key not in seen_chapters:
-            chapter_chunks = get_all_chunks_for_chapter(DB_PATH, book_title, chapter_title)
+            chapter_chunks = get_all_chunks_for_chapter(DB_PATH, book_title, chapter_title, text_store)
             all_relevant_chunks.extend(chapter_chunks)
             seen_chapters.add(chapter_key)
 
@@ -0,0 +1,226 @@
+"""
+Script: text_store.py
+
+1) Reads chunk texts from the SQLite database.
+2) Packs them into a single blob file plus an offset/length table indexed by chunk ID.
+3) Optionally compresses each chunk (zlib) and strips the `text` column from SQLite,
+   leaving only the metadata in the database.
+
+At query time the blob and table are memory-mapped, so fetching a chunk's text is a
+constant-time slice instead of a row read and copy out of SQLite. Each table entry
+records a key of the chunk's metadata and its text length, so entries that no longer
+match their SQLite row (e.g. after books.db is rebuilt) are ignored.
+
+Usage:
+    python text_store.py [--compress] [--strip-db]
+"""
+
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+# SQLite database location
+DB_PATH = "books.db"
+
+# Packed text store files
+TEXT_BLOB_PATH = "chunk_texts.bin"
+TEXT_TABLE_PATH = "chunk_texts.idx"
+
+# Table layout: header (magic, version, flags) followed by one
+# (offset, length, text_length, key) entry per chunk ID, so the entry for a chunk
+# lives at a fixed position.
+TABLE_MAGIC = b"PTXT"
+TABLE_VERSION = 2
+TABLE_HEADER = struct.Struct("<4sHH")
+TABLE_ENTRY = struct.Struct("<QIII")
+FLAG_ZLIB = 1
+MISSING_LENGTH = 0xFFFFFFFF
+
+# Chunk metadata columns, plus the text length SQLite reports (0 once stripped)
+METADATA_COLUMNS = "id, book_title, chapter_title, local_index, length(text)"
+
+# SQLite's default limit on bound parameters in older versions
+MAX_SQL_PARAMS = 999
+
+
+def chunk_key(book_title, chapter_title, local_index):
+    """
+    Returns a 32-bit key of a chunk's metadata, used to check that a store entry
+    still belongs to the SQLite row with the same ID.
+    """
+    return zlib.crc32(f"{book_title}\0{chapter_title}\0{local_index}".encode("utf-8"))
+
+
+def get_chunk_texts_from_db(db_path):
+    """
+    Reads chunk texts and metadata from the SQLite database.
+    Returns a list of (chunk_id, book_title, chapter_title, local_index, text).
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, book_title, chapter_title, local_index, text FROM chunks ORDER BY id")
+    chunks = cursor.fetchall()
+    conn.close()
+    return chunks
+
+
+def merge_with_store(chunks, store):
+    """
+    Fills in chunks whose text was stripped from SQLite with their text from the
+    existing store, so rebuilding after --strip-db doesn't lose them.
+    Raises ValueError if a stripped chunk is not in the store.
+    """
+    merged = []
+    for chunk_id, book_title, chapter_title, local_index, text in chunks:
+        if not text:
+            key = chunk_key(book_title, chapter_title, local_index)
+            text = get_chunk_text(store, chunk_id, key, 0) if store else None
+            if text is None:
+                raise ValueError(f"Chunk {chunk_id} has no text in the database or the text store")
+        merged.append((chunk_id, book_title, chapter_title, local_index, text))
+    return merged
+
+
+def write_text_store(chunks, blob_path, table_path, compress=False):
+    """
+    Writes (chunk_id, book_title, chapter_title, local_index, text) rows into the
+    blob file and offset/length table.
+    Chunk IDs without text get a MISSING_LENGTH entry.
+    Both files are written to temporary paths and then moved into place, so a
+    running app keeps reading its mapping of the old files.
+    """
+    max_id = max((chunk[0] for chunk in chunks), default=-1)
+    entries = [(0, MISSING_LENGTH, 0, 0)] * (max_id + 1)
+    blob_tmp_path = f"{blob_path}.tmp"
+    table_tmp_path = f"{table_path}.tmp"
+
+    offset = 0
+    with open(blob_tmp_path, "wb") as blob:
+        for chunk_id, book_title, chapter_title, local_index, text in chunks:
+            data = text.encode("utf-8")
+            if compress:
+                data = zlib.compress(data)
+            blob.write(data)
+            key = chunk_key(book_title, chapter_title, local_index)
+            entries[chunk_id] = (offset, len(data), len(text), key)
+            offset += len(data)
+
+    flags = FLAG_ZLIB if compress else 0
+    with open(table_tmp_path, "wb") as table:
+        table.write(TABLE_HEADER.pack(TABLE_MAGIC, TABLE_VERSION, flags))
+        for entry in entries:
+            table.write(TABLE_ENTRY.pack(*entry))
+
+    os.replace(blob_tmp_path, blob_path)
+    os.replace(table_tmp_path, table_path)
+
+    print(f"Packed {len(chunks)} chunks ({offset} bytes) into {blob_path}")
+
+
+def strip_texts_from_db(db_path):
+    """
+    Empties the `text` column in SQLite (it is NOT NULL) and reclaims the space.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE chunks SET text = ''")
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    print(f"Chunk texts stripped from {db_path}")
+
+
+def _map_file(path):
+    with open(path, "rb") as f:
+        if Path(path).stat().st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def load_text_store(blob_path=TEXT_BLOB_PATH, table_path=TEXT_TABLE_PATH):
+    """
+    Memory-maps the packed text store.
+    Returns None if the store has not been built.
+    """
+    if not (Path(blob_path).exists() and Path(table_path).exists()):
+        return None
+
+    table = _map_file(table_path)
+    magic, version, flags = TABLE_HEADER.unpack_from(table, 0)
+    if magic != TABLE_MAGIC or version != TABLE_VERSION:
+        raise ValueError(f"Unsupported text store table: {table_path}")
+
+    return {
+        "blob": _map_file(blob_path),
+        "table": table,
+        "count": (len(table) - TABLE_HEADER.size) // TABLE_ENTRY.size,
+        "compressed": bool(flags & FLAG_ZLIB),
+    }
+
+
+def get_chunk_text(store, chunk_id, key, text_length):
+    """
+    Returns the text of a chunk by slicing it out of the mapped blob.
+    `key` is the chunk_key of the SQLite row and `text_length` its text length
+    (0 if stripped). Returns None if the chunk is not in the store or its entry
+    doesn't match the row.
+    """
+    if not 0 <= chunk_id < store["count"]:
+        return None
+
+    position = TABLE_HEADER.size + chunk_id * TABLE_ENTRY.size
+    offset, length, stored_text_length, stored_key = TABLE_ENTRY.unpack_from(store["table"], position)
+    if length == MISSING_LENGTH or stored_key != key:
+        return None
+    if text_length and text_length != stored_text_length:
+        return None
+
+    data = store["blob"][offset:offset + length]
+    if store["compressed"]:
+        data = zlib.decompress(data)
+    return data.decode("utf-8")
+
+
+def resolve_texts(cursor, rows, store):
+    """
+    Takes rows selected with METADATA_COLUMNS and returns
+    (chunk_id, book_title, chapter_title, local_index, text) rows.
+    Texts are sliced from the store where its entry matches the row; only the
+    remaining chunks are read from SQLite.
+    """
+    texts = {}
+    for chunk_id, book_title, chapter_title, local_index, text_length in rows:
+        key = chunk_key(book_title, chapter_title, local_index)
+        text = get_chunk_text(store, chunk_id, key, text_length)
+        if text is not None:
+            texts[chunk_id] = text
+
+    missing = [row[0] for row in rows if row[0] not in texts]
+    for start in range(0, len(missing), MAX_SQL_PARAMS):
+        batch = missing[start:start + MAX_SQL_PARAMS]
+        cursor.execute(f"SELECT id, text FROM chunks WHERE id IN ({','.join(['?'] * len(batch))})", batch)
+        texts.update(cursor.fetchall())
+
+    return [(*row[:-1], texts[row[0]]) for row in rows]
+
+
+def main():
+    compress = "--compress" in sys.argv
+    strip_db = "--strip-db" in sys.argv
+
+    print("Loading chunks from SQLite database...")
+    chunks = merge_with_store(get_chunk_texts_from_db(DB_PATH), load_text_store())
+
+    write_text_store(chunks, TEXT_BLOB_PATH, TEXT_TABLE_PATH, compress=compress)
+
+    if strip_db:
+        strip_texts_from_db(DB_PATH)
+
+    print("Text store built.")
+
+
+if __name__ == "__main__":
+    main()